@@ -1,10 +1,46 @@
+# Fully annotated (passes mypy --strict), so it can also be built with `mypyc final_filter.py`;
+# Python then imports the extension in place of this file. The time goes into re and dict
+# lookups, which mypyc cannot speed up, so expect only a few percent from the build.
 import re
-from rapidfuzz import process
+import sys
+import warnings
+from typing import Optional
 
 '''PART 1: UNIT EXTRACTION AND NORMALIZATION'''
 
+# Unit strings are interned once at import, so unit comparisons in the hot paths can
+# short-circuit on identity
+
+
+def _interned_abbreviations(abbreviation_table: dict[str, list[str]]) -> dict[str, list[str]]:
+    """
+    Intern every full unit form and abbreviation of the table.
+
+    Parameters:
+    abbreviation_table (dict): Full unit forms mapped to their abbreviations.
+
+    Returns:
+    dict: The same table built from interned strings.
+    """
+    return {sys.intern(full_unit): [sys.intern(abbrev) for abbrev in abbreviations]
+            for full_unit, abbreviations in abbreviation_table.items()}
+
+
+def _frozen_categories(categories: dict[str, set[str]]) -> dict[str, frozenset[str]]:
+    """
+    Freeze every unit set of the categories, interning the units.
+
+    Parameters:
+    categories (dict): Category names mapped to their sets of full unit forms.
+
+    Returns:
+    dict: The same categories with frozensets of interned units.
+    """
+    return {category: frozenset(sys.intern(unit) for unit in units) for category, units in categories.items()}
+
+
 # Define a dictionary with full unit forms and their abbreviations
-unit_fullform_to_abbreviation = {
+unit_fullform_to_abbreviation = _interned_abbreviations({
     'centimetre': ['cm', 'centimeter', 'centimetres', 'centimeters'],
     'millimetre': ['mm', 'millimeter', 'millimetres', 'millimeters'],
     'metre': ['m', 'meter', 'meters', 'metres'],
@@ -36,7 +72,7 @@ unit_fullform_to_abbreviation = {
     'quart': ['qt', 'quarts'],
     'microlitre': ['ul', 'μl', 'microlitres', 'microliters'],
     'cup': ['cup', 'cups']
-}
+})
 
 # Conversion factors to the smallest units (e.g., millimeters for length)
 conversion_factors_to_smallest = {
@@ -50,64 +86,71 @@ conversion_factors_to_smallest = {
 }
 
 # Unit categories for classification
-unit_categories = {
+unit_categories = _frozen_categories({
     'length': {'millimetre', 'centimetre', 'metre', 'inch', 'foot', 'yard'},
     'weight': {'milligram', 'gram', 'kilogram', 'microgram', 'ounce', 'pound', 'ton'},
     'voltage': {'millivolt', 'volt', 'kilovolt'},
     'volume': {'millilitre', 'litre', 'centilitre', 'decilitre', 'fluid ounce', 'gallon', 'pint', 'quart', 'microlitre', 'cubic inch', 'cubic foot'},
     'wattage': {'watt', 'kilowatt'}
-}
+})
 
-# Flatten the list of all unit abbreviations for fuzzy matching
+# Flatten the list of all unit abbreviations
 all_units = [abbrev for unit_list in unit_fullform_to_abbreviation.values() for abbrev in unit_list]
 
+# Precompiled regexes (compiled once at import instead of on every call)
+_WS_RE = re.compile(r'\s+')  # Runs of whitespace
+
+# Lowercased abbreviation/full form -> full unit, built once for O(1) lookups
+_ABBR2FULL = {sys.intern(abbrev.lower()): full_unit for full_unit, abbreviations in unit_fullform_to_abbreviation.items()
+              for abbrev in abbreviations}
+_ABBR2FULL.update({sys.intern(full_unit.lower()): full_unit for full_unit in unit_fullform_to_abbreviation})
+
+
+# A number not preceded by a digit (so a long digit run is only tried from its start), followed by
+# a unit token; quote marks count as feet/inches only when no letter follows, as in 5' 10"
+_NUM_UNIT_RE = re.compile(r'(?<!\d)(\d+(?:\.\d+)?)\s*([a-zA-Z]+|["\'](?![a-zA-Z]))')
+
 
-def extract_numbers_with_units(text):
+def extract_numbers_with_units(text: str) -> list[tuple[str, str]]:
     """
-    Extract numbers and corresponding units from text using regex and fuzzy matching.
+    Extract numbers and corresponding units from text using regex and a dictionary lookup
+    of known units.
 
     Parameters:
     text (str): The input text to extract numbers and units from.
 
     Returns:
-    list: List of numbers with their normalized units.
+    list: List of (number, full-form unit) tuples.
     """
-    pattern = r'(\d+(\.\d+)?)(\s*)([a-zA-Z]+)'  # Regex pattern to match numbers followed by unit strings
-    matches = re.findall(pattern, text)
-
     results = []
-    for match in matches:
-        number = match[0]
-        unit_candidate = match[3]
-        # Fuzzy match the extracted unit with the closest valid unit abbreviation
-        results_fuzzy = process.extractOne(unit_candidate, all_units, score_cutoff=95)
-        if results_fuzzy:
-            matched_unit = results_fuzzy[0]
-            results.append(f"{number} {matched_unit}")  # Append the number and matched unit
+    for number, unit_candidate in _NUM_UNIT_RE.findall(text):
+        # Known abbreviations and full forms resolve with a single case-insensitive lookup
+        matched_unit = _ABBR2FULL.get(unit_candidate.lower())
+        if matched_unit:
+            results.append((number, matched_unit))  # Append the number and matched unit
 
     return results
 
 
 '''PART 2: SEPARATION OF NUMBERS AND UNITS'''
 
-def separate_numbers_and_units(output):
+def separate_numbers_and_units(output: list[tuple[str, str]]) -> tuple[list[str], list[str]]:
     """
     Separate numbers and units from the extracted results.
 
+    Deprecated: extract_numbers_with_units already returns (number, unit) tuples, so
+    this only unzips them.
+
     Parameters:
-    output (list): List of extracted number-unit pairs.
+    output (list): List of extracted (number, unit) tuples.
 
     Returns:
     tuple: Two lists containing numbers and corresponding units separately.
     """
-    numbers_list = []
-    units_list = []
-    for item in output:
-        match = re.match(r'([0-9.]+)\s*(\w+)', item)  # Regex to match number and unit
-        if match:
-            number, unit = match.groups()
-            numbers_list.append(number)
-            units_list.append(unit)
+    warnings.warn("separate_numbers_and_units is deprecated; extract_numbers_with_units "
+                  "returns (number, unit) tuples", DeprecationWarning, stacklevel=2)
+    numbers_list = [number for number, _ in output]
+    units_list = [unit for _, unit in output]
 
     return numbers_list, units_list
 
@@ -116,7 +159,7 @@ def separate_numbers_and_units(output):
 
 allowed_units = set(unit_fullform_to_abbreviation.keys())
 
-def get_full_unit(unit_input):
+def get_full_unit(unit_input: str) -> str:
     """
     Convert a unit abbreviation to its full form.
 
@@ -126,16 +169,11 @@ def get_full_unit(unit_input):
     Returns:
     str: Full form of the unit or an empty string if not found.
     """
-    unit_input = re.sub(r'\s+', ' ', unit_input.lower().strip())  # Clean and normalize input
-
-    for full_unit, abbreviations in unit_fullform_to_abbreviation.items():
-        if unit_input == full_unit or unit_input in abbreviations:
-            return full_unit
-
-    return ""  # Return empty if no match is found
+    # Clean and normalize input, return empty if no match is found
+    return _ABBR2FULL.get(_WS_RE.sub(' ', unit_input.lower().strip()), "")
 
 
-def convert_to_full_unit(input_text):
+def convert_to_full_unit(input_text: str) -> tuple[list[str], list[str], list[str]]:
     """
     Extract numbers and units from text and convert units to their full forms.
 
@@ -145,11 +183,11 @@ def convert_to_full_unit(input_text):
     Returns:
     tuple: Final formatted result, list of numbers, list of full-form units.
     """
-    output = extract_numbers_with_units(input_text)  # Extract numbers and fuzzy-matched units
-    numbers, units = separate_numbers_and_units(output)
+    # Extract numbers and resolve their units to full forms in a single pass over the matches
+    pairs = extract_numbers_with_units(input_text)
 
-    # Convert units to full forms
-    full_units = [get_full_unit(unit) for unit in units]
+    numbers = [num for num, _ in pairs]
+    full_units = [unit for _, unit in pairs]
     final_result = [f"{num} {unit}" for num, unit in zip(numbers, full_units)]  # Combine numbers and full-form units
 
     return final_result, numbers, full_units
@@ -157,7 +195,16 @@ def convert_to_full_unit(input_text):
 
 '''PART 4: CATEGORIZE AND CONVERT UNITS BASED ON CATEGORY'''
 
-def categorize_values(numbers, result):
+# Converted values of one category, as (value in smallest unit, "number unit" label) tuples
+CategoryValues = list[tuple[float, str]]
+
+# Full unit -> (category, conversion factor to the category's smallest unit)
+_UNIT_META = {unit: (category, conversion_factors_to_smallest[unit])
+              for category, units in unit_categories.items()
+              for unit in units if unit in conversion_factors_to_smallest}
+
+
+def categorize_values(numbers: list[str], result: list[str]) -> dict[str, CategoryValues]:
     """
     Categorize and convert the extracted values based on unit categories.
 
@@ -168,23 +215,23 @@ def categorize_values(numbers, result):
     Returns:
     dict: Categorized values converted to their smallest units.
     """
-    categorized_values = {
+    categorized_values: dict[str, CategoryValues] = {
         'length': [], 'weight': [], 'voltage': [], 'volume': [], 'wattage': []
     }
 
     # Categorize and convert each value to its smallest unit
     for num, unit in zip(numbers, result):
-        for category, unit_set in unit_categories.items():
-            if unit in unit_set:
-                converted_value = float(num) * conversion_factors_to_smallest[unit]
-                categorized_values[category].append((converted_value, f"{num} {unit}"))
+        meta = _UNIT_META.get(unit)
+        if meta:
+            category, factor = meta
+            categorized_values[category].append((float(num) * factor, f"{num} {unit}"))
 
     return categorized_values
 
 
 '''PART 5: GET ENTITY VALUE BASED ON CATEGORIZED UNITS'''
 
-def get_entity_value(entity_value, categorized_values):
+def get_entity_value(entity_value: str, categorized_values: dict[str, CategoryValues]) -> Optional[str]:
     """
     Get the appropriate value for the given entity based on the categorized units.
 
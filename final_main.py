@@ -1,34 +1,70 @@
-import os
+import atexit
+import csv
+import functools
+import hashlib
+import queue
+import shelve
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import easyocr
 import pandas as pd
 import requests
-from PIL import Image
-from io import BytesIO
+from requests.adapters import HTTPAdapter
 import cv2
 from matplotlib import pyplot as plt
 import numpy as np
 from final_filter import *  # Assuming you have utility functions here
 
 # Initialize EasyOCR Model (do it once to avoid loading the model multiple times)
-reader = easyocr.Reader(['en'])
+# EasyOCR falls back to the CPU on its own when no GPU is available
+reader = easyocr.Reader(['en'], gpu=True)
 
-# Function to run EasyOCR on an image
+# Number of images sent through OCR together
+ocr_batch_size = 8
 
+# Number of images downloaded concurrently
+download_workers = 16
 
-def easyocr_model(image):
+# Shared HTTP session so downloads reuse pooled connections instead of a new TCP/TLS handshake per image
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_connections=32, pool_maxsize=32))
+SESSION.mount('https://', HTTPAdapter(pool_connections=32, pool_maxsize=32))
+
+# Sharpening kernel, shared by the CPU and GPU paths so both apply the exact same filter
+sharpen_kernel = np.array([[0, -1, 0],
+                           [-1, 5, -1],
+                           [0, -1, 0]], dtype=np.float32)
+
+# Sharpening runs on the GPU when OpenCV was built with CUDA support
+use_cuda = hasattr(cv2, 'cuda') and cv2.cuda.getCudaEnabledDeviceCount() > 0
+if use_cuda:
+    cuda_sharpen_filter = cv2.cuda.createLinearFilter(cv2.CV_8UC1, cv2.CV_8UC1, sharpen_kernel)
+
+# Function to run EasyOCR on a batch of images
+
+
+def easyocr_model_batched(images):
     """
-    Perform OCR on an image using EasyOCR.
+    Perform OCR on several images, batching images of the same size together.
 
     Parameters:
-    image (numpy array): The pre-processed image on which OCR will be performed.
+    images (list): Pre-processed images on which OCR will be performed.
 
     Returns:
-    str: Extracted text from the image.
+    list: Extracted text for each image, in input order.
     """
-    result = reader.readtext(image)
-    # Join all extracted text segments
-    text = ' '.join([item[1] for item in result])
-    return text
+    texts = [None] * len(images)
+
+    # EasyOCR can only stack images of identical shape into one batch
+    groups = {}
+    for i, image in enumerate(images):
+        groups.setdefault(image.shape, []).append(i)
+
+    for positions in groups.values():
+        results = reader.readtext_batched([images[i] for i in positions], batch_size=ocr_batch_size)
+        for i, result in zip(positions, results):
+            texts[i] = ' '.join([item[1] for item in result])
+    return texts
 
 # Convert image to grayscale
 
@@ -50,21 +86,26 @@ def grayscale(image):
 
 def load_image_from_url(image_url):
     """
-    Download an image from the given URL and load it into memory using PIL.
+    Download an image from the given URL and decode it straight into a BGR numpy array with OpenCV.
 
     Parameters:
     image_url (str): URL of the image to download.
 
     Returns:
-    PIL.Image or None: Returns the image if successful, else None.
+    numpy array or None: Returns the image if successful, else None.
     """
     try:
-        response = requests.get(image_url)
-        if response.status_code == 200:
-            return Image.open(BytesIO(response.content))
-        else:
-            print(f"Failed to download image from {image_url}")
-            return None
+        with SESSION.get(image_url, stream=True) as response:
+            if response.status_code == 200:
+                # Read the raw body once and decode it in place, without an intermediate buffer copy
+                data = np.frombuffer(response.raw.read(decode_content=True), np.uint8)
+                image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+                if image is None:
+                    print(f"Failed to decode image from {image_url}")
+                return image
+            else:
+                print(f"Failed to download image from {image_url}")
+                return None
     except Exception as e:
         print(f"Error loading image: {e}")
         return None
@@ -104,80 +145,199 @@ def sharpen_image(gray_image):
     Returns:
     numpy array: Sharpened image.
     """
-    kernel = np.array([[0, -1, 0],
-                       [-1, 5, -1],
-                       [0, -1, 0]])  # Sharpening kernel
-    return cv2.filter2D(gray_image, -1, kernel)
+    if use_cuda:
+        gpu_image = cv2.cuda_GpuMat()
+        gpu_image.upload(gray_image)
+        return cuda_sharpen_filter.apply(gpu_image).download()
+    return cv2.filter2D(gray_image, -1, sharpen_kernel)
 
+# Function to pre-process an image for OCR
 
-# Load the dataset from a CSV file
-input_csv = 'C:/Users/Shubham/Desktop/AML/main/exp.csv'
-output_csv = 'output_easyocr.csv'
 
-# Read input data
-data = pd.read_csv(input_csv)
+def preprocess_image(image):
+    """
+    Grayscale the image, invert it if the background is dark, and sharpen it.
+
+    Parameters:
+    image (numpy array): Original image in BGR format.
 
-# Initialize results list and set batch size for periodic saving
-results = []
-batch_size = 5  # Save results to CSV every 5 images
+    Returns:
+    numpy array: Pre-processed grayscale image.
+    """
+    return sharpen_image(inversion_check(image))
 
-# Main loop to process each image
-for _, row in data.iterrows():
-    index = row['index']
-    image_link = row['image_link']
-    entity_name = row['entity_name']
+# Functions to cache OCR text per image URL, in memory and on disk across runs
 
-    print(f"Processing Image: {image_link}")
 
-    # Load image from URL
-    image = load_image_from_url(image_link)
+def cache_key(image_url):
+    """
+    Build the on-disk cache key for an image URL.
 
-    if image:
-        try:
-            # Convert PIL image to a numpy array (OpenCV format)
-            image_np = np.array(image)
+    Parameters:
+    image_url (str): URL of the image (missing links read by pandas as NaN are accepted too).
 
-            # Pre-process image: Grayscale, check for inversion, then sharpen
-            grayscale_image = inversion_check(image_np)
-            sharpened_image = sharpen_image(grayscale_image)
+    Returns:
+    str: SHA-1 hex digest of the URL.
+    """
+    return hashlib.sha1(str(image_url).encode('utf-8')).hexdigest()
 
-            # Perform OCR to extract text
-            extracted_text = easyocr_model(sharpened_image)
-        except Exception as e:
-            # In case of an error, save the error message
-            extracted_text = f"Error: {e}"
-    else:
-        # Handle case where image couldn't be loaded
-        extracted_text = "Image not available"
-
-    # Process extracted text to get numerical values and units
-    extract, num, units = convert_to_full_unit(extracted_text)
-    categorized_values = categorize_values(num, units)
-    final_val = get_entity_value(entity_name, categorized_values)
-
-    # Store results in a list
-    results.append({
-        'index': index,
-        'prediction': final_val
-    })
-
-    print(f'Index: {index}, Entity Value: {entity_name}, Value: {final_val}')
-
-    # Save results every batch_size iterations or at the last iteration
-    if (index + 1) % batch_size == 0 or index == len(data) - 1:
-        output_df = pd.DataFrame(results)
-
-        # Append to CSV if it exists, otherwise create it
-        if not os.path.isfile(output_csv):
-            output_df.to_csv(output_csv, index=False,
-                             columns=['index', 'prediction'])
-        else:
-            output_df.to_csv(output_csv, mode='a', header=False,
-                             index=False, columns=['index', 'prediction'])
-
-        # Clear results list after saving to CSV
-        results = []
-
-        print(f"Appended results to {output_csv}")
 
+@functools.lru_cache(maxsize=10000)
+def _cached_ocr_text(image_url):
+    # Raises KeyError on a miss; exceptions are not memoized, so later stores are still seen
+    return ocr_cache[cache_key(image_url)]
+
+
+def lookup_ocr_text(image_url):
+    """
+    Get the OCR text previously extracted from an image URL.
+
+    Parameters:
+    image_url (str): URL of the image.
+
+    Returns:
+    str or None: Cached OCR text, or None if the image has not been processed yet.
+    """
+    try:
+        return _cached_ocr_text(image_url)
+    except KeyError:
+        return None
+
+
+def store_ocr_text(image_url, text):
+    """
+    Save the OCR text extracted from an image URL to the cache.
+
+    Parameters:
+    image_url (str): URL of the image.
+    text (str): Text extracted from the image.
+    """
+    key = cache_key(image_url)
+    ocr_cache[key] = text
+    cached_keys.add(key)
+
+# Function to download images in the background while OCR runs
+
+
+def download_images(rows, download_queue):
+    """
+    Download the images of all rows concurrently and queue them in row order.
+
+    Images whose OCR text is already cached, or which were already downloaded for an
+    earlier row, are not downloaded again and are queued as None.
+
+    Parameters:
+    rows (list): Rows of (index, image_link, entity_name).
+    download_queue (queue.Queue): Queue receiving (row, image) pairs, then None once all rows are done.
+    """
+    seen_links = set()
+    try:
+        with ThreadPoolExecutor(max_workers=download_workers) as executor:
+            # Submit one chunk at a time so downloads never run far ahead of OCR
+            for start in range(0, len(rows), download_workers):
+                chunk = rows[start:start + download_workers]
+                links = []
+                for _, image_link, _ in chunk:
+                    if image_link not in seen_links and cache_key(image_link) not in cached_keys:
+                        links.append(image_link)
+                    seen_links.add(image_link)
+                images = dict(zip(links, executor.map(load_image_from_url, links)))
+                for row in chunk:
+                    download_queue.put((row, images.pop(row[1], None)))
+    finally:
+        # Always signal the end, so the main loop never waits forever if downloading fails
+        download_queue.put(None)
+
+
+# Load the dataset from a CSV file
+input_csv = 'C:/Users/Shubham/Desktop/AML/main/exp.csv'
+output_csv = 'output_easyocr.csv'
+ocr_cache_file = 'ocr_cache'  # Shelve file caching OCR text per image URL across runs
+
+# Read input data
+data = pd.read_csv(input_csv)
+
+# Open the output CSV once and stream results into it, flushing periodically
+batch_size = 100  # Flush results to CSV every 100 images
+output_file = open(output_csv, 'w', newline='')
+atexit.register(output_file.close)  # Still closes (and flushes) the file if processing stops early
+writer = csv.writer(output_file)
+writer.writerow(['index', 'prediction'])
+
+# Open the OCR cache; the producer thread only reads the key set, the shelf is used from the main thread
+ocr_cache = shelve.open(ocr_cache_file)
+atexit.register(ocr_cache.close)
+cached_keys = set(ocr_cache.keys())
+
+# Download images in a background thread so network I/O overlaps with OCR
+rows = list(data[['index', 'image_link', 'entity_name']].itertuples(index=False, name=None))
+download_queue = queue.Queue(maxsize=2 * download_workers)
+threading.Thread(target=download_images, args=(rows, download_queue), daemon=True).start()
+
+# Main loop to process the images in batches
+rows_done = 0
+finished = False
+while not finished:
+    # Collect the next batch of downloaded images
+    batch = []
+    images = []
+    while len(batch) < ocr_batch_size:
+        item = download_queue.get()
+        if item is None:
+            finished = True
+            break
+        batch.append(item[0])
+        images.append(item[1])
+
+    if not batch:
+        break
+
+    extracted_texts = [None] * len(batch)
+    processed = {}
+    for i, ((_, image_link, _), image) in enumerate(zip(batch, images)):
+        print(f"Processing Image: {image_link}")
+
+        if image is not None:
+            try:
+                # Pre-process image: Grayscale, check for inversion, then sharpen
+                processed[i] = preprocess_image(image)
+            except Exception as e:
+                # In case of an error, save the error message
+                extracted_texts[i] = f"Error: {e}"
+
+    # Perform OCR to extract text from all pre-processed images at once
+    if processed:
+        try:
+            for i, text in zip(processed, easyocr_model_batched(list(processed.values()))):
+                extracted_texts[i] = text
+                store_ocr_text(batch[i][1], text)
+        except Exception as e:
+            for i in processed:
+                extracted_texts[i] = f"Error: {e}"
+
+    # Images that were not downloaded were either OCR'd before or couldn't be loaded
+    for i, (_, image_link, _) in enumerate(batch):
+        if extracted_texts[i] is None:
+            cached_text = lookup_ocr_text(image_link)
+            extracted_texts[i] = cached_text if cached_text is not None else "Image not available"
+
+    for (index, image_link, entity_name), extracted_text in zip(batch, extracted_texts):
+        # Process extracted text to get numerical values and units
+        extract, num, units = convert_to_full_unit(extracted_text)
+        categorized_values = categorize_values(num, units)
+        final_val = get_entity_value(entity_name, categorized_values)
+
+        # Write the result straight to the CSV
+        writer.writerow((index, final_val))
+
+        print(f'Index: {index}, Entity Value: {entity_name}, Value: {final_val}')
+
+        # Flush results every batch_size rows or at the last row (counted by position, not by the CSV's index column)
+        rows_done += 1
+        if rows_done % batch_size == 0 or rows_done == len(rows):
+            output_file.flush()
+            print(f"Appended results to {output_csv}")
+
+output_file.close()
+ocr_cache.close()
 print(f"Results saved to {output_csv}")